@@ -1,5 +1,7 @@
 from typing import TypedDict, Annotated, Optional
+import os
 import sqlite3
+import threading
 from dotenv import load_dotenv
 from langchain_core.messages import BaseMessage, HumanMessage
 from langchain_openai import ChatOpenAI
@@ -14,7 +16,9 @@ import requests
 
 load_dotenv()
 
-tavily_search_tool = TavilySearch(max_results = 3)
+# One module serves both the tools-enabled and plain-chat variants of the app;
+# set ENABLE_TOOLS=0 to run without tool calling (no Tavily client, no ToolNode).
+ENABLE_TOOLS = os.getenv("ENABLE_TOOLS", "1").lower() not in ("0", "false")
 
 
 @tool
@@ -53,12 +57,18 @@ def get_stock_price(symbol: str) -> dict:
     return r.json()
 
 
-tools = [tavily_search_tool, calculator, get_stock_price]
-tool_node = ToolNode(tools = tools)
-
 # ---- LLM_with_tools ----
 llm = ChatOpenAI(model="gpt-4o-mini")
-llm_with_tools = llm.bind_tools(tools = tools)
+
+if ENABLE_TOOLS:
+    tavily_search_tool = TavilySearch(max_results = 3)
+    tools = [tavily_search_tool, calculator, get_stock_price]
+    tool_node = ToolNode(tools = tools)
+    llm_with_tools = llm.bind_tools(tools = tools)
+else:
+    tools = []
+    tool_node = None
+    llm_with_tools = llm
 
 # ---- State ----
 class ChatState(TypedDict):
@@ -72,67 +82,178 @@ def chat_node(state: ChatState):
     return {"messages": [response]}
 
 # ---- SQLite + Checkpointer ----
-# Allows DB connection across multiple threads (Streamlit)
-conn = sqlite3.connect(database="chatbot.db", check_same_thread=False)
 
-# Titles table (persist chat titles)
-conn.execute(
-    """
-    CREATE TABLE IF NOT EXISTS thread_summaries (
-        thread_id   TEXT PRIMARY KEY,
-        title       TEXT NOT NULL,
-        updated_at  TEXT NOT NULL DEFAULT (datetime('now'))
-    )
-    """
-)
-conn.commit()
+def _apply_pragmas(c: sqlite3.Connection) -> None:
+    # Performance pragmas: WAL lets readers (sidebar) and the checkpointer
+    # writer run concurrently, and NORMAL synchronous skips the per-commit
+    # fsync that WAL makes safe.
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute("PRAGMA synchronous=NORMAL")
+    c.execute("PRAGMA cache_size=-65536")        # 64 MB page cache
+    c.execute("PRAGMA temp_store=MEMORY")
+    c.execute("PRAGMA mmap_size=268435456")      # 256 MB
+    c.execute("PRAGMA busy_timeout=5000")        # ms; avoids "database is locked"
+
+# Dedicated connection for LangGraph's checkpointer (and one-time schema init).
+# check_same_thread=False because Streamlit calls the graph from worker threads.
+# Pragmas are applied before SqliteSaver is built so it inherits WAL mode.
+conn = sqlite3.connect(database="chatbot.db", check_same_thread=False,
+                       cached_statements=256)
+_apply_pragmas(conn)
+
+# Every other thread gets its own lazily-created connection, so sidebar reads
+# don't queue behind checkpoint writes on SQLite's per-handle mutex.
+_local = threading.local()
+
+def get_conn() -> sqlite3.Connection:
+    c = getattr(_local, "conn", None)
+    if c is None:
+        c = sqlite3.connect(database="chatbot.db", cached_statements=256)
+        _apply_pragmas(c)
+        _local.conn = c
+    return c
 
 checkpointer = SqliteSaver(conn=conn)
 
+_initialized = False
+
+def _init_schema() -> None:
+    """Create app tables/indexes once, ever.
+
+    A cheap PRAGMA user_version read decides whether any DDL runs at all, so
+    warm starts against an existing chatbot.db skip the CREATE statements
+    (and their write/fsync) entirely. First-time setup batches the DDL into
+    a single transaction.
+    """
+    global _initialized
+    if _initialized:
+        return
+    if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+        checkpointer.setup()  # create checkpoint tables now so the index DDL works
+        with conn:
+            # Titles table (persist chat titles)
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS thread_summaries (
+                    thread_id   TEXT PRIMARY KEY,
+                    title       TEXT NOT NULL,
+                    updated_at  TEXT NOT NULL DEFAULT (datetime('now'))
+                )
+                """
+            )
+            # Speeds up the DISTINCT thread_id scan in retrieve_all_threads
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_checkpoints_thread ON checkpoints(thread_id)"
+            )
+            conn.execute("PRAGMA user_version = 1")
+    _initialized = True
+
+_init_schema()
+
 # ---- Graph ----
 graph = StateGraph(ChatState)
 graph.add_node("chat_node", chat_node)
-graph.add_node("tools", tool_node)
-
 graph.add_edge(START, "chat_node")
-graph.add_conditional_edges("chat_node", tools_condition, {"tools": "tools",
-                                                           END: END})
-graph.add_edge("tools", "chat_node")
+
+if ENABLE_TOOLS:
+    graph.add_node("tools", tool_node)
+    graph.add_conditional_edges("chat_node", tools_condition, {"tools": "tools",
+                                                               END: END})
+    graph.add_edge("tools", "chat_node")
+else:
+    graph.add_edge("chat_node", END)
 
 chatbot = graph.compile(checkpointer=checkpointer)
 
 # ---- Threads API ----
 def retrieve_all_threads() -> list[str]:
-    """Return all unique thread_ids that have checkpoints."""
-    all_threads = set()
-    for checkpoint in checkpointer.list(None):
-        tid = str(checkpoint.config["configurable"]["thread_id"])
-        all_threads.add(tid)
-    return list(all_threads)
+    """Return all unique thread_ids that have checkpoints.
+
+    Queries the checkpoints table directly instead of iterating
+    checkpointer.list(None), which would deserialize every checkpoint
+    blob just to read its thread_id.
+    """
+    rows = get_conn().execute(_SQL_DISTINCT_THREADS).fetchall()
+    return [str(r[0]) for r in rows]
 
 # ---- Summaries API ----
+
+# SQL hoisted to module level: passing the same string object to execute()
+# guarantees hits in pysqlite's prepared-statement cache, so the hot per-turn
+# paths reuse compiled plans instead of re-parsing SQL.
+_SQL_UPSERT_SUMMARY = """
+    INSERT INTO thread_summaries (thread_id, title, updated_at)
+    VALUES (?, ?, datetime('now'))
+    ON CONFLICT(thread_id) DO UPDATE SET
+        title = excluded.title,
+        updated_at = excluded.updated_at
+"""
+
+_SQL_GET_SUMMARY = "SELECT title FROM thread_summaries WHERE thread_id = ?"
+
+_SQL_LIST_SUMMARIES = (
+    "SELECT thread_id, title FROM thread_summaries ORDER BY updated_at DESC"
+)
+
+_SQL_DISTINCT_THREADS = "SELECT DISTINCT thread_id FROM checkpoints"
+
+_SQL_THREADS_WITH_TITLES = """
+    SELECT DISTINCT c.thread_id, COALESCE(s.title, 'New Conversation')
+    FROM checkpoints c
+    LEFT JOIN thread_summaries s ON s.thread_id = c.thread_id
+    ORDER BY s.updated_at ASC NULLS FIRST
+"""
+
+# Write-through cache of {thread_id: title}: saves a synchronous SQLite query
+# on every chat turn that re-checks whether a title exists.
+_summary_cache: dict[str, str] = {}
+_summary_cache_loaded = False
+
 def save_thread_summary(thread_id: str, title: str) -> None:
-    conn.execute(
-        """
-        INSERT INTO thread_summaries (thread_id, title, updated_at)
-        VALUES (?, ?, datetime('now'))
-        ON CONFLICT(thread_id) DO UPDATE SET
-            title = excluded.title,
-            updated_at = excluded.updated_at
-        """,
-        (str(thread_id), title),
-    )
-    conn.commit()
+    # `with c:` commits the upsert in a single transaction; with WAL +
+    # synchronous=NORMAL this avoids a dedicated fsync per title write
+    # (titles are regenerable UI metadata, not critical data).
+    c = get_conn()
+    with c:
+        c.execute(_SQL_UPSERT_SUMMARY, (str(thread_id), title))
+    _summary_cache[str(thread_id)] = title
 
 def get_thread_summary(thread_id: str) -> Optional[str]:
-    row = conn.execute(
-        "SELECT title FROM thread_summaries WHERE thread_id = ?",
-        (str(thread_id),),
-    ).fetchone()
-    return row[0] if row else None
+    tid = str(thread_id)
+    cached = _summary_cache.get(tid)
+    if cached is not None:
+        return cached
+    row = get_conn().execute(_SQL_GET_SUMMARY, (tid,)).fetchone()
+    if row:
+        _summary_cache[tid] = row[0]
+        return row[0]
+    return None
+
+def load_threads_with_titles() -> dict[str, str]:
+    """Return {thread_id: title} for every thread with checkpoints, in one query.
+
+    LEFT JOINs thread_summaries so threads without a saved title fall back to
+    the placeholder, saving the frontend a second round trip plus a Python-side
+    merge loop at session start. Ordered oldest-first to match the sidebar's
+    append-then-reverse convention.
+    """
+    rows = get_conn().execute(_SQL_THREADS_WITH_TITLES).fetchall()
+    return {str(tid): title for (tid, title) in rows}
+
+def checkpoint_wal() -> None:
+    """Truncate the WAL file back into the main DB (call once per app start).
+
+    WAL grows without bound if no writer ever checkpoints it; a periodic
+    TRUNCATE keeps chatbot.db-wal small.
+    """
+    get_conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
 
 def load_thread_summaries() -> dict[str, str]:
-    rows = conn.execute(
-        "SELECT thread_id, title FROM thread_summaries ORDER BY updated_at DESC"
-    ).fetchall()
-    return {tid: title for (tid, title) in rows}
+    global _summary_cache_loaded
+    if not _summary_cache_loaded:
+        rows = get_conn().execute(_SQL_LIST_SUMMARIES).fetchall()
+        # update() over (tid, title) rows is a C-level fast path — no
+        # Python-level dict comprehension per row
+        _summary_cache.update(rows)
+        _summary_cache_loaded = True
+    return dict(_summary_cache)
@@ -1,29 +1,51 @@
 import re
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 
 from langgraph_database_backend import (
-    chatbot,
-    retrieve_all_threads,
-    llm,
     save_thread_summary,
     get_thread_summary,
-    load_thread_summaries,
+    load_threads_with_titles,
+    checkpoint_wal,
 )
 
 # ============================ Utilities ============================
 
+@st.cache_resource
+def get_chatbot():
+    # cache_resource pins the compiled graph (and its checkpointer) for the
+    # process, so Streamlit hot-reloads never rebuild or recompile it
+    from langgraph_database_backend import chatbot
+    return chatbot
+
+@st.cache_resource
+def get_llm():
+    from langgraph_database_backend import llm
+    return llm
+
+# Precompiled patterns — these run on every new-thread first turn and every
+# sidebar title render, so skip per-call re.compile lookups.
+_WS_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\w+[\w-]*")
+_QUOTE_RE = re.compile(r'["“”\'`]+')
+_BULLET_RE = re.compile(r"[•]+")
+_TRAIL_PUNCT_RE = re.compile(r"[\.\!\?،؛，。]+$")
+
 def generate_thread_id() -> str:
     # use string IDs everywhere for consistency
     return str(uuid.uuid4())
 
 def add_thread(thread_id: str):
     tid = str(thread_id)
-    if tid not in st.session_state["chat_threads"]:
+    # membership via the parallel set — O(1) vs scanning the whole list,
+    # and this runs on every Streamlit rerun
+    if tid not in st.session_state["chat_threads_set"]:
         st.session_state["chat_threads"].append(tid)
-    if tid not in st.session_state["thread_summaries"]:
-        st.session_state["thread_summaries"][tid] = "New Conversation"
+        st.session_state["chat_threads_set"].add(tid)
+    st.session_state["thread_summaries"].setdefault(tid, "New Conversation")
 
 def reset_chat():
     thread_id = generate_thread_id()
@@ -31,17 +53,53 @@ def reset_chat():
     add_thread(thread_id)
     st.session_state["message_history"] = []
 
-def load_conversation(thread_id: str):
+def load_conversation(thread_id: str, limit: int | None = None):
+    """Return the thread's messages, optionally only the most recent `limit`.
+
+    Bounding the slice keeps the UI scrollback rebuild proportional to what
+    is actually rendered rather than the full accumulated history.
+    """
     config = {"configurable": {"thread_id": str(thread_id)}}
-    state = chatbot.get_state(config)
+    state = get_chatbot().get_state(config)
     if state is None:
         return []
-    return state.values.get("messages", [])
+    messages = state.values.get("messages", [])
+    if limit is not None:
+        messages = messages[-limit:]
+    return messages
+
+# --------- History rebuild (checkpoint messages -> UI dicts) ---------
+
+def _handle_human(msg, temp_messages, pending_tools):
+    temp_messages.append({"role": "user", "content": msg.content})
+
+def _handle_tool(msg, temp_messages, pending_tools):
+    pending_tools.append(getattr(msg, "name", "tool"))
+
+def _handle_ai(msg, temp_messages, pending_tools):
+    # attach the tools collected since the last assistant turn
+    temp_messages.append({
+        "role": "assistant",
+        "content": msg.content if isinstance(msg.content, str) else str(msg.content),
+        "tools": pending_tools[:]  # copy
+    })
+    pending_tools.clear()
+
+def _handle_other(msg, temp_messages, pending_tools):
+    pass
+
+# type-keyed dispatch: one dict lookup per message instead of an
+# isinstance chain, which matters when rebuilding long histories
+_MSG_HANDLERS = {
+    HumanMessage: _handle_human,
+    ToolMessage: _handle_tool,
+    AIMessage: _handle_ai,
+}
 
 # --------- Title generation ---------
 
 def _to_title_case(s: str) -> str:
-    return re.sub(r"\s+", " ", s).strip().title()
+    return _WS_RE.sub(" ", s).strip().title()
 
 def _heuristic_title(messages) -> str:
     # Fallback: first user message → first 8 words
@@ -52,7 +110,7 @@ def _heuristic_title(messages) -> str:
             break
     if not first_user:
         return "New Conversation"
-    words = re.findall(r"\w+[\w-]*", first_user)[:8]
+    words = _WORD_RE.findall(first_user)[:8]
     return _to_title_case(" ".join(words)) or "New Conversation"
 
 def generate_summary(messages) -> str:
@@ -65,15 +123,20 @@ def generate_summary(messages) -> str:
     if not messages:
         return "New Conversation"
 
-    # small excerpt (first few turns only)
-    convo_lines = []
-    for msg in messages[:4]:
-        role = "User" if isinstance(msg, HumanMessage) else "Assistant"
-        text = msg.content.replace("\n", " ").strip()
-        if len(text) > 240:
-            text = text[:240] + "..."
-        convo_lines.append(f"{role}: {text}")
-    excerpt = "\n".join(convo_lines)
+    # common case: a single short first message needs no excerpt assembly,
+    # and a smaller prompt means fewer tokens billed and a faster response
+    if len(messages) == 1 and len(messages[0].content) < 80:
+        excerpt = f"User: {messages[0].content.strip()}"
+    else:
+        # small excerpt (first few turns only)
+        convo_lines = [None] * min(4, len(messages))
+        for i, msg in enumerate(messages[:4]):
+            role = "User" if isinstance(msg, HumanMessage) else "Assistant"
+            text = msg.content.replace("\n", " ").strip()
+            if len(text) > 240:
+                text = text[:240] + "..."
+            convo_lines[i] = f"{role}: {text}"
+        excerpt = "\n".join(convo_lines)
 
     prompt = f"""
 You create concise chat titles.
@@ -91,21 +154,45 @@ Return ONLY the title text.
 """.strip()
 
     try:
-        resp = llm.invoke(prompt)
+        resp = get_llm().invoke(prompt)
         title = resp.content.strip()
         # sanitize
-        title = re.sub(r'["“”\'`]+', "", title)
-        title = re.sub(r"[•\u2022]+", "", title)
-        title = re.sub(r"[\.\!\?،،؛，。]+$", "", title)  # strip trailing punctuation
+        title = _QUOTE_RE.sub("", title)
+        title = _BULLET_RE.sub("", title)
+        title = _TRAIL_PUNCT_RE.sub("", title)  # strip trailing punctuation
         # clamp words
-        words = re.findall(r"\w+[\w-]*", title)[:8]
+        words = _WORD_RE.findall(title)[:8]
         title = _to_title_case(" ".join(words))
         return title if title else _heuristic_title(messages)
     except Exception:
         return _heuristic_title(messages)
 
+# One worker is plenty: at most one new thread needs a title at a time
+_title_executor = ThreadPoolExecutor(max_workers=1)
+
+def refine_title_async(thread_id: str, messages) -> None:
+    """Refine a heuristic title with the LLM off the critical path.
+
+    The refined title only goes to the DB (and backend cache); the sidebar
+    picks it up on the next rerun. Failures are ignored — the heuristic
+    title already saved is good enough.
+    """
+    def _refine():
+        try:
+            title = generate_summary(messages)
+            if title and title != "New Conversation":
+                save_thread_summary(thread_id, title)
+        except Exception:
+            pass
+    _title_executor.submit(_refine)
+
 # ============================ Session Setup ============================
 
+if "wal_checkpointed" not in st.session_state:
+    # Once per session: fold the WAL back into the main DB so it can't grow unbounded
+    checkpoint_wal()
+    st.session_state["wal_checkpointed"] = True
+
 if "message_history" not in st.session_state:
     st.session_state["message_history"] = []
 
@@ -113,15 +200,11 @@ if "thread_id" not in st.session_state:
     st.session_state["thread_id"] = generate_thread_id()
 
 if "chat_threads" not in st.session_state:
-    st.session_state["chat_threads"] = retrieve_all_threads()
-
-if "thread_summaries" not in st.session_state:
-    # Load all titles from DB once; fall back to placeholder
-    db_summaries = load_thread_summaries()  # {thread_id: title}
-    st.session_state["thread_summaries"] = {}
-    for thread_id in st.session_state["chat_threads"]:
-        tid = str(thread_id)
-        st.session_state["thread_summaries"][tid] = db_summaries.get(tid, "New Conversation")
+    # One joined query gives threads + titles (placeholder already applied)
+    summaries = load_threads_with_titles()  # {thread_id: title}
+    st.session_state["chat_threads"] = list(summaries)
+    st.session_state["chat_threads_set"] = set(summaries)
+    st.session_state["thread_summaries"] = summaries
 
 # current thread is tracked
 add_thread(st.session_state["thread_id"])
@@ -135,34 +218,20 @@ if st.sidebar.button("New Chat"):
 
 st.sidebar.header("My Conversations")
 
-# Showing most recent first
-for thread_id in st.session_state["chat_threads"][::-1]:
+# Showing most recent first — reversed() iterates lazily, no copy per rerun
+for thread_id in reversed(st.session_state["chat_threads"]):
     tid = str(thread_id)
     summary = st.session_state["thread_summaries"].get(tid, "New Conversation")
     # When a thread button is clicked:
     if st.sidebar.button(summary, key=f"btn_{tid}"):
         st.session_state["thread_id"] = tid
-        messages = load_conversation(tid)
+        messages = load_conversation(tid, limit=50)
 
         temp_messages = []
         pending_tools = []  # collect tools seen before the next AI message
 
         for msg in messages:
-            if isinstance(msg, HumanMessage):
-                temp_messages.append({"role": "user", "content": msg.content})
-
-            elif isinstance(msg, ToolMessage):
-                tool_name = getattr(msg, "name", "tool")
-                pending_tools.append(tool_name)
-
-            elif isinstance(msg, AIMessage):
-                # attach the tools collected since the last assistant turn
-                temp_messages.append({
-                    "role": "assistant",
-                    "content": msg.content if isinstance(msg.content, str) else str(msg.content),
-                    "tools": pending_tools[:]  # copy
-                })
-                pending_tools.clear()
+            _MSG_HANDLERS.get(type(msg), _handle_other)(msg, temp_messages, pending_tools)
 
         # If tools exist at the end without a following AIMessage, you can choose to
         # attach them to the last assistant message (optional/edge case)
@@ -212,10 +281,17 @@ if user_input:
         final_text = []
         tools_used = []  # NEW: persist tools used in this assistant turn
         tool_logs = []                 # NEW: keep the lines so we can persist/replay
+        log_text = {"value": ""}       # running joined string; grows by one line at a time
 
+        def append_log(line: str):
+            # append only the new line instead of re-joining the whole list,
+            # keeping log rendering O(n) over a tool-heavy turn instead of O(n²)
+            tool_logs.append(line)
+            log_text["value"] += ("\n" if log_text["value"] else "") + line
+            log_area.markdown(log_text["value"])
 
         def ai_only_stream():
-            for message_chunk, metadata in chatbot.stream(
+            for message_chunk, metadata in get_chatbot().stream(
                 {"messages": [HumanMessage(content=user_input)]},
                 config=CONFIG,
                 stream_mode="messages",
@@ -229,17 +305,14 @@ if user_input:
                         status_holder["box"] = st.status(
                             f"🔧 Using `{tool_name}` …", expanded=True
                         )
-                        tool_logs.append("- Calling API…")         # first line
+                        append_log("- Calling API…")         # first line
                     else:
                         status_holder["box"].update(
                             label=f"🔧 Using `{tool_name}` …",
                             state="running",
                             expanded=True,
                         )
-                        tool_logs.append("- Still working…")       # subsequent line(s)
-
-                    # Re-render the full log each time (replaces previous content)
-                    log_area.markdown("\n".join(tool_logs))
+                        append_log("- Still working…")       # subsequent line(s)
 
                 if isinstance(message_chunk, AIMessage):
                     text_chunk = str(message_chunk.content)
@@ -250,8 +323,7 @@ if user_input:
 
         # After streaming finishes
         if status_holder["box"] is not None:
-            tool_logs.append("- Done.")          # NEW
-            log_area.markdown("\n".join(tool_logs))
+            append_log("- Done.")                # NEW
             status_holder["box"].update(
                 label="✅ Tool finished",
                 state="complete",
@@ -269,11 +341,21 @@ if user_input:
 
     # 3) One-time: generate & persist title if not present
     tid = str(st.session_state["thread_id"])
-    existing_title = get_thread_summary(tid)
+    # session cache first; only hit the DB if the title is unknown/placeholder
+    existing_title = st.session_state["thread_summaries"].get(tid)
     if not existing_title or existing_title == "New Conversation":
-        # Use authoritative history from backend
-        messages = load_conversation(tid)
-        if messages:
-            title = generate_summary(messages)
-            save_thread_summary(tid, title)               # persist in DB
-            st.session_state["thread_summaries"][tid] = title
+        existing_title = get_thread_summary(tid)
+    if not existing_title or existing_title == "New Conversation":
+        # The turn we just streamed is already in memory — no need to
+        # re-read (and unpickle) the checkpoint from SQLite for the title.
+        messages = [
+            HumanMessage(content=user_input),
+            AIMessage(content="".join(final_text)),
+        ]
+        # Heuristic title is free and instant; LLM refinement happens
+        # in the background so the first turn isn't blocked on a
+        # network round trip.
+        title = _heuristic_title(messages)
+        save_thread_summary(tid, title)               # persist in DB
+        st.session_state["thread_summaries"][tid] = title
+        refine_title_async(tid, messages)